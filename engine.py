@@ -0,0 +1,386 @@
+"""
+Module containing the detection engine shared by the camera and the offline scripts.
+"""
+import cv2
+import time
+import queue
+import threading
+from sort.sort import *
+from pathlib import Path
+from ultralytics import YOLO
+from datetime import datetime
+
+from scheduler import FrameScheduler
+from startup import ThreadBudget, warm_up
+from util import (
+    http_post,
+    get_vehicles,
+    delete_files_in_directory,
+    similarity_percentage,
+    LicensePlateCache
+)
+
+vehicles = [2, 7]
+
+
+def load_models(vehicle_model_path=None):
+    """
+    Load the vehicle and license plate detection models.
+
+    Args:
+        vehicle_model_path (str): Path to the vehicle detection model, model/yolov8n.pt if None.
+
+    Returns:
+        tuple: Tuple containing the vehicle and the license plate detection models.
+    """
+    model_path = Path(__file__).parent / "model" / "yolov8n.pt"
+    license_plate_path = Path(__file__).parent / "model" / "best.pt"
+
+    nnPath = vehicle_model_path or str(model_path)
+
+    if not Path(nnPath).exists():
+        raise FileNotFoundError(f'El modelo requerido no se encuentra en {nnPath}')
+
+    if not license_plate_path.exists():
+        raise FileNotFoundError(f'El modelo de placa de licencia no se encuentra en {license_plate_path}')
+
+    return YOLO(nnPath), YOLO(str(license_plate_path))
+
+
+class DetectionEngine(object):
+    """
+    Detects, tracks and reads the license plates of the vehicles of the frames of a source.
+    """
+
+    def __init__(self, coco_model, license_plate_model, event_store=None, thread_budget=None,
+                 post=True, deadline=0.3, clock=time.monotonic, display=False, window="video", recorder=None,
+                 scheduler=None, register_queue_size=16, max_age=5, det_thresh=0.25):
+        """
+        Args:
+            coco_model (YOLO): Vehicle detection model.
+            license_plate_model (YOLO): License plate detection model.
+            event_store (EventStore): Store of the detection events, events are not stored if None.
+            thread_budget (ThreadBudget): Thread budget of the stages, the default budget if None.
+            post (bool): Send the detections to the API.
+            deadline (float): End-to-end latency deadline of a frame in seconds, no stage is shed if None.
+            clock (callable): Clock of the capture timestamps of the frames, in seconds.
+            display (bool): Show the annotated frames in a window.
+            window (str): Name of the window.
+            recorder (Recorder): Recorder of the frames and the detections, nothing is recorded if None.
+            scheduler (FrameScheduler): Scheduler of the stages, one with the deadline and the clock if None.
+            register_queue_size (int): Detections waiting to be saved and sent before new ones are dropped.
+            max_age (int): Frames a track is kept without detections.
+            det_thresh (float): Score needed to start a track, lower scores only extend tracks. All the
+                detections start tracks if None.
+        """
+        self.coco_model = coco_model
+        self.license_plate_model = license_plate_model
+        self.event_store = event_store
+        self.thread_budget = thread_budget or ThreadBudget()
+        self.post = post
+        if scheduler is None and deadline is not None:
+            scheduler = FrameScheduler(deadline=deadline, clock=clock)
+        self.scheduler = scheduler
+        self.display = display
+        self.window = window
+        self.recorder = recorder
+
+        self.mot_tracker = Sort(max_age=max_age, det_thresh=det_thresh)
+        self.ocr_cache = LicensePlateCache()
+        self.last_license_plate = None
+        self.last_checked_hour = None
+        self.frames = 0
+        self.elapsed = 0.0
+
+        # the images and the API request of a detection are handled by a background thread, so a slow API
+        # or disk does not hold the frames
+        self.register_queue = queue.Queue(maxsize=register_queue_size)
+        self.register_dropped = 0
+        self.register_thread = threading.Thread(target=self._register_worker, daemon=True)
+        self.register_thread.start()
+
+    def warm_up(self):
+        """
+        Run dummy inferences of every stage before the first frame.
+
+        Returns:
+            dict: Steady state latency of each stage in milliseconds.
+        """
+        return warm_up(self.thread_budget, self.coco_model, self.license_plate_model)
+
+    def allow(self, stage, capture_time):
+        """
+        Ask the scheduler if a stage fits in the deadline, recording the decision.
+
+        Args:
+            stage (str): Name of the stage.
+            capture_time (float): Capture timestamp of the frame.
+
+        Returns:
+            bool: True if the stage should run, False if it must be skipped.
+        """
+        allowed = self.scheduler.allow(stage, capture_time)
+        if self.recorder is not None:
+            self.recorder.add_decision(stage, allowed)
+        return allowed
+
+    def process_frame(self, frame, capture_time=None):
+        """
+        Detect, track and read the license plates of the vehicles in a single frame.
+
+        Args:
+            frame (numpy.ndarray): BGR frame to process, annotated in place.
+            capture_time (float): Capture timestamp of the frame, in the clock of the engine.
+
+        Returns:
+            numpy.ndarray: Array with the tracked vehicles bounding boxes and their IDs, None if the frame was shed.
+        """
+        scheduler = self.scheduler
+        if scheduler is not None:
+            if capture_time is None:
+                capture_time = scheduler.clock()
+            if not self.allow('vehicles', capture_time):
+                return None
+
+        start = time.perf_counter()
+        with self.thread_budget.stage('vehicles'):
+            detections = self.coco_model(frame, conf=0.1)[0].boxes.data.tolist()
+        if self.recorder is not None:
+            self.recorder.add_detections('vehicles', detections)
+        detections_ = []
+
+        for detection in detections:
+            x1, y1, x2, y2, conf, class_id = detection
+            if int(class_id) in vehicles:
+                detections_.append([x1, y1, x2, y2, conf, class_id])
+
+        vehicles_ids = self.mot_tracker.update(np.array(detections_).reshape((-1, 6)))
+        if scheduler is not None:
+            scheduler.record('vehicles', time.perf_counter() - start)
+
+        width = frame.shape[1]
+        mid_width = width // 2
+
+        width_entrance = mid_width - 400
+        width_exit = mid_width + 400
+
+        if scheduler is not None and not self.allow('license_plates', capture_time):
+            scheduler.finish(capture_time)
+            return vehicles_ids
+
+        start = time.perf_counter()
+        with self.thread_budget.stage('license_plates'):
+            license_plates = self.license_plate_model(frame)[0].boxes.data.tolist()
+        if self.recorder is not None:
+            self.recorder.add_detections('license_plates', license_plates)
+        if scheduler is not None:
+            scheduler.record('license_plates', time.perf_counter() - start)
+
+        for license_plate in license_plates:
+            x1, y1, x2, y2, score, class_id = license_plate
+            if x1 < width_entrance or x1 > width_exit and score > 0.75:
+                xvehi1, yvehi1, xvehi2, yvehi2, vehi_ids = get_vehicles(license_plate, vehicles_ids)
+
+                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
+                cv2.rectangle(frame, (int(xvehi1), int(yvehi1)), (int(xvehi2), int(yvehi2)), (0, 0, 255), 2)
+
+                vehicle_crop = frame[int(yvehi1):int(yvehi2), int(xvehi1):int(xvehi2), :]
+
+                license_plate_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
+                license_plate_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
+                kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
+                license_plate_sharpen = cv2.filter2D(license_plate_gray, -1, kernel)
+
+                if scheduler is not None and not self.allow('ocr', capture_time):
+                    continue
+
+                start = time.perf_counter()
+                misses = self.ocr_cache.misses
+                with self.thread_budget.stage('ocr'):
+                    license_plate_text, license_plate_score = self.ocr_cache.read(license_plate_sharpen, vehi_ids)
+                # cache hits take no OCR time, only real reads update the estimated cost
+                if scheduler is not None and self.ocr_cache.misses > misses:
+                    scheduler.record('ocr', time.perf_counter() - start)
+
+                if x1 < mid_width:
+                    direction = "entrada"
+                else:
+                    direction = "salida"
+
+                if license_plate_text is not None and vehicle_crop.size > 0:
+                    if self.last_license_plate is not None:
+                        similarity = similarity_percentage(self.last_license_plate, license_plate_text)
+                        if license_plate_text == self.last_license_plate or similarity > 50:
+                            continue
+
+                    self.last_license_plate = license_plate_text
+                    self.submit(license_plate_text, license_plate_score, direction, vehicle_crop,
+                                license_plate_crop, vehi_ids)
+
+        if scheduler is not None:
+            scheduler.finish(capture_time)
+
+        return vehicles_ids
+
+    def submit(self, text, score, direction, vehicle_crop, license_plate_crop, track_id):
+        """
+        Queue a detection to be registered by the background thread, dropping it if the queue is full.
+
+        Args:
+            text (str): License plate text.
+            score (float): Confidence score of the license plate text.
+            direction (str): Direction of the vehicle.
+            vehicle_crop (numpy.ndarray): Crop of the vehicle.
+            license_plate_crop (numpy.ndarray): Crop of the license plate.
+            track_id (int): ID of the tracked vehicle.
+
+        Returns:
+            bool: True if the detection was queued.
+        """
+        # the crops are views of the frame, which is annotated before the detection is registered
+        item = (text, score, direction, vehicle_crop.copy(), license_plate_crop.copy(), track_id,
+                datetime.now())
+        try:
+            self.register_queue.put_nowait(item)
+        except queue.Full:
+            self.register_dropped += 1
+            if self.scheduler is not None:
+                self.scheduler.drop('register')
+            return False
+        return True
+
+    def _register_worker(self):
+        while True:
+            item = self.register_queue.get()
+            if item is None:
+                return
+            try:
+                self.register(*item)
+            except (OSError, ValueError, cv2.error) as e:
+                print(f'Error al registrar la detección. Razón: {e}')
+
+    def register(self, text, score, direction, vehicle_crop, license_plate_crop, track_id, event_time=None):
+        """
+        Save the images of a detection, send it to the API and store the event.
+
+        Args:
+            text (str): License plate text.
+            score (float): Confidence score of the license plate text.
+            direction (str): Direction of the vehicle.
+            vehicle_crop (numpy.ndarray): Crop of the vehicle.
+            license_plate_crop (numpy.ndarray): Crop of the license plate.
+            track_id (int): ID of the tracked vehicle.
+            event_time (datetime): Time of the detection, now if None.
+        """
+        if event_time is None:
+            event_time = datetime.now()
+        current_time = event_time.strftime('%Y-%m-%d_%H-%M-%S-%f')
+
+        print(f"Placa de licencia: {text}")
+        print(f"Confianza: {score}")
+        print(f"Vehículo: {direction}")
+
+        vehicle_img_name = f"vehicle_{text}_{current_time}.jpg"
+        vehicle_crop = cv2.resize(vehicle_crop, (0, 0), fx=0.7, fy=0.7)
+        cv2.imwrite(f"photos/vehicles/{vehicle_img_name}", vehicle_crop)
+
+        license_plate_img_name = f"license_plate_{text}_{current_time}.jpg"
+        license_plate_crop = cv2.resize(license_plate_crop, (0, 0), fx=0.7, fy=0.7)
+        cv2.imwrite(f"photos/license_plates/{license_plate_img_name}", license_plate_crop)
+
+        if self.post:
+            http_post(score, license_plate_img_name, vehicle_img_name, text, direction)
+
+        if self.event_store is not None:
+            self.event_store.append(text, score, direction,
+                                    {'vehicle': f"photos/vehicles/{vehicle_img_name}",
+                                     'license_plate': f"photos/license_plates/{license_plate_img_name}"},
+                                    timestamp=event_time.timestamp(), track_id=int(track_id))
+
+    def show(self, frame):
+        """
+        Draw the entrance and exit areas and show the frame.
+
+        Args:
+            frame (numpy.ndarray): Annotated frame.
+
+        Returns:
+            bool: False if the user asked to quit.
+        """
+        width = frame.shape[1]
+        mid_width = width // 2
+
+        cv2.rectangle(frame, (0, 0), (mid_width, frame.shape[0]), (0, 0, 0), 2)
+        cv2.putText(frame, "Entrada", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+        cv2.rectangle(frame, (mid_width, 0), (width, frame.shape[0]), (0, 0, 0), 2)
+        cv2.putText(frame, "Salida", (mid_width + 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+
+        frame = cv2.resize(frame, (0, 0), fx=0.7, fy=0.7)
+        cv2.imshow(self.window, frame)
+        return cv2.waitKey(1) & 0xFF != ord('q')
+
+    def apply_retention(self):
+        """
+        Delete the saved photos once a day.
+        """
+        current_hour = datetime.now().hour
+        current_minute = datetime.now().minute
+        if current_hour == 12 and current_minute == 5 and current_hour != self.last_checked_hour:
+            delete_files_in_directory("photos/license_plates")
+            delete_files_in_directory("photos/vehicles")
+            self.last_checked_hour = current_hour
+
+    def run(self, source):
+        """
+        Process every frame of a source until it ends or the user quits.
+
+        Args:
+            source (FrameSource): Source of the frames.
+        """
+        try:
+            for frame, capture_time in source:
+                if self.recorder is not None:
+                    self.recorder.write_frame(frame, capture_time)
+
+                start = time.perf_counter()
+                self.process_frame(frame, capture_time)
+                self.elapsed += time.perf_counter() - start
+                self.frames += 1
+
+                self.apply_retention()
+
+                if self.display and not self.show(frame):
+                    break
+        finally:
+            source.close()
+            if self.display:
+                cv2.destroyAllWindows()
+
+    def close(self):
+        """
+        Wait until the queued detections are registered and stop the background thread.
+        """
+        self.register_queue.put(None)
+        self.register_thread.join()
+
+    def print_stats(self, source=None):
+        """
+        Print the throughput, the OCR cache and the scheduling statistics.
+
+        Args:
+            source (FrameSource): Source whose dropped frames are reported.
+        """
+        if self.frames:
+            print(f"Cuadros procesados: {self.frames}, {self.frames / self.elapsed:.1f} FPS")
+        if source is not None:
+            print(f"Cuadros atrasados descartados por la fuente: {source.dropped} de {source.frames}")
+
+        stats = self.ocr_cache.stats()
+        print(f"Caché OCR: {stats['hit_rate']:.1%} de aciertos, {stats['ocr_time_saved']:.1f} s de OCR ahorrados")
+        print(f"Llamadas OCR: {stats['misses']}, IDs de vehículos: {KalmanBoxTracker.count}")
+        print(f"Registros descartados por la cola llena: {self.register_dropped}")
+
+        if self.scheduler is not None:
+            stats = self.scheduler.stats()
+            print(f"Cuadros descartados: {stats['shed']} de {stats['frames']}, "
+                  f"latencia máxima {stats['max_latency'] * 1000:.0f} ms")
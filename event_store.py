@@ -0,0 +1,270 @@
+"""
+Module containing the local append-only store of the detection events.
+
+Events are appended as JSON lines to segment files. The store keeps in memory an index by
+timestamp and an index by license plate text pointing to the position of each event in its
+segment, so the sightings of a plate are found without reading the whole store. Sealed segments
+are compacted in the background, dropping expired events and the links to images already removed
+by the photos/ retention.
+
+Run as a script to query the store:
+
+    python event_store.py --plate ABCD12 --days 7
+"""
+import os
+import json
+import time
+import bisect
+import argparse
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta
+
+
+class EventStore(object):
+    """
+    Append-only store of detection events with indexes by timestamp and by license plate.
+    """
+
+    def __init__(self, directory, max_segment_bytes=4 * 1024 ** 2, retention_days=90):
+        """
+        Args:
+            directory (str): Directory of the segment files, created if it does not exist.
+            max_segment_bytes (int): Size at which the active segment is sealed and a new one started.
+            retention_days (float): Days an event is kept before compaction drops it, forever if None.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_segment_bytes = max_segment_bytes
+        self.retention_days = retention_days
+        self.lock = threading.RLock()
+        self.compaction_thread = None
+        self.stop_event = threading.Event()
+        self._load()
+
+    def _segments(self):
+        return sorted(self.directory.glob('segment_*.jsonl'))
+
+    def _load(self):
+        self.time_index = []
+        self.plate_index = {}
+        segments = self._segments()
+        for segment in segments:
+            length = self._index_segment(segment)
+            if length < segment.stat().st_size:
+                # a partial line left by an interrupted write, the next event must start on its own line
+                os.truncate(segment, length)
+
+        if segments:
+            number = int(segments[-1].stem.split('_')[1])
+        else:
+            number = 0
+        self.active = self.directory / f"segment_{number:06d}.jsonl"
+        if self.active.exists() and self.active.stat().st_size >= self.max_segment_bytes:
+            self.active = self.directory / f"segment_{number + 1:06d}.jsonl"
+
+    def _index_segment(self, segment):
+        with open(segment, 'rb') as segment_file:
+            offset = 0
+            for line in segment_file:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    event = None
+                if event is not None:
+                    self._index_event(event, segment.name, offset)
+                offset += len(line)
+        return offset
+
+    def _index_event(self, event, segment_name, offset):
+        entry = (event['time'], segment_name, offset)
+        for entries in (self.time_index, self.plate_index.setdefault(event['plate'], [])):
+            if entries and entry[0] < entries[-1][0]:
+                bisect.insort(entries, entry)
+            else:
+                entries.append(entry)
+
+    def append(self, plate, score, direction, images, timestamp=None, **fields):
+        """
+        Append a detection event.
+
+        Args:
+            plate (str): License plate text.
+            score (float): Confidence score of the license plate text.
+            direction (str): Direction of the vehicle.
+            images (dict): Paths of the image files of the event, by kind ('vehicle', 'license_plate').
+            timestamp (float): Time of the event in seconds since the epoch, now if None.
+            **fields: Additional values stored with the event.
+
+        Returns:
+            dict: Stored event.
+        """
+        event = {
+            'time': time.time() if timestamp is None else timestamp,
+            'plate': plate,
+            'score': score,
+            'direction': direction,
+            'images': images
+        }
+        event.update(fields)
+        line = (json.dumps(event) + '\n').encode('utf-8')
+
+        with self.lock:
+            if self.active.exists() and self.active.stat().st_size >= self.max_segment_bytes:
+                number = int(self.active.stem.split('_')[1])
+                self.active = self.directory / f"segment_{number + 1:06d}.jsonl"
+
+            with open(self.active, 'ab') as segment_file:
+                offset = segment_file.tell()
+                segment_file.write(line)
+            self._index_event(event, self.active.name, offset)
+
+        return event
+
+    def _read(self, entries):
+        events = []
+        by_segment = {}
+        for _, segment_name, offset in entries:
+            by_segment.setdefault(segment_name, []).append(offset)
+
+        for segment_name, offsets in by_segment.items():
+            with open(self.directory / segment_name, 'rb') as segment_file:
+                for offset in offsets:
+                    segment_file.seek(offset)
+                    events.append(json.loads(segment_file.readline()))
+
+        events.sort(key=lambda event: event['time'])
+        return events
+
+    def query(self, plate=None, start=None, end=None):
+        """
+        Get the events of a license plate and/or a time range.
+
+        Args:
+            plate (str): License plate text, any plate if None.
+            start (float): First timestamp included, in seconds since the epoch.
+            end (float): Last timestamp included, in seconds since the epoch.
+
+        Returns:
+            list: Events sorted by time.
+        """
+        with self.lock:
+            entries = self.time_index if plate is None else self.plate_index.get(plate, [])
+            low = 0 if start is None else bisect.bisect_left(entries, (start,))
+            high = len(entries) if end is None else bisect.bisect_right(entries, (end, chr(0x10ffff)))
+            return self._read(entries[low:high])
+
+    def compact(self):
+        """
+        Rewrite the sealed segments, dropping expired events and links to removed images.
+
+        Returns:
+            int: Number of events dropped.
+        """
+        with self.lock:
+            sealed = [segment for segment in self._segments() if segment != self.active]
+        if len(sealed) == 0:
+            return 0
+
+        cutoff = None
+        if self.retention_days is not None:
+            cutoff = time.time() - self.retention_days * 86400
+
+        kept = []
+        dropped = 0
+        for segment in sealed:
+            with open(segment, 'rb') as segment_file:
+                for line in segment_file:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        continue
+                    if cutoff is not None and event['time'] < cutoff:
+                        dropped += 1
+                        continue
+                    event['images'] = {kind: path for kind, path in event['images'].items()
+                                       if path is not None and os.path.exists(path)}
+                    kept.append(event)
+        kept.sort(key=lambda event: event['time'])
+
+        lines = [(json.dumps(event) + '\n').encode('utf-8') for event in kept]
+        # the new segments reuse the names of the sealed ones, so they stay before the active segment;
+        # a segment is sealed once it reaches the size limit, raised only if the names would not suffice
+        limit = max(self.max_segment_bytes, sum(len(line) for line in lines) / len(sealed))
+        temporaries = []
+        segment_file = None
+        size = 0
+        for line in lines:
+            if segment_file is None or size >= limit:
+                if segment_file is not None:
+                    segment_file.close()
+                temporaries.append(sealed[len(temporaries)].with_suffix('.tmp'))
+                segment_file = open(temporaries[-1], 'wb')
+                size = 0
+            segment_file.write(line)
+            size += len(line)
+        if segment_file is not None:
+            segment_file.close()
+
+        with self.lock:
+            for temporary, target in zip(temporaries, sealed):
+                os.replace(temporary, target)
+            for segment in sealed[len(temporaries):]:
+                segment.unlink()
+            self._load()
+
+        return dropped
+
+    def start_compaction(self, interval=3600):
+        """
+        Compact the store periodically in a background thread.
+
+        Args:
+            interval (float): Seconds between compactions.
+        """
+        def run():
+            while not self.stop_event.wait(interval):
+                try:
+                    self.compact()
+                except (OSError, ValueError) as e:
+                    print(f'Error al compactar los eventos. Razón: {e}')
+
+        self.compaction_thread = threading.Thread(target=run, daemon=True)
+        self.compaction_thread.start()
+
+    def close(self):
+        """
+        Stop the background compaction.
+        """
+        self.stop_event.set()
+        if self.compaction_thread is not None:
+            self.compaction_thread.join()
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Query of the detection events')
+    parser.add_argument('--directory', help='Directory of the event store.', type=str,
+                        default=str(Path(__file__).parent / 'events'))
+    parser.add_argument('--plate', help='License plate text.', type=str, default=None)
+    parser.add_argument('--days', help='Days back from now.', type=float, default=None)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    store = EventStore(args.directory)
+    start = None
+    if args.days is not None:
+        start = (datetime.now() - timedelta(days=args.days)).timestamp()
+
+    query_start = time.perf_counter()
+    events = store.query(plate=args.plate, start=start)
+    elapsed = (time.perf_counter() - query_start) * 1000
+
+    for event in events:
+        print(f"{datetime.fromtimestamp(event['time']):%Y-%m-%d %H:%M:%S} {event['plate']} "
+              f"{event['direction']} {event['score']:.2f} {' '.join(event['images'].values())}")
+    print(f"{len(events)} eventos en {elapsed:.1f} ms")
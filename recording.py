@@ -0,0 +1,257 @@
+"""
+Module containing the recording of the frame stream for its later replay.
+
+A recording is a directory with two files: frames.bin, the JPEG encoded frames one after the other,
+and index.jsonl, one JSON line per frame with its capture timestamp, the position of its JPEG in
+frames.bin, the raw outputs of the detection models on it and the decisions of the scheduler.
+"""
+import cv2
+import json
+import queue
+import threading
+import numpy as np
+from pathlib import Path
+
+from scheduler import FrameScheduler
+
+
+class Recorder(object):
+    """
+    Writes the frames, their capture timestamps, the detections and the scheduling decisions of a stream
+    to a recording.
+
+    The frames are JPEG encoded and written by a background thread, so the encoding is not added to the
+    latency of the frames. The recording stops when it reaches its size or duration limit.
+    """
+
+    def __init__(self, directory, quality=90, max_bytes=None, max_seconds=None, queue_size=32):
+        """
+        Args:
+            directory (str): Directory of the recording, created if it does not exist.
+            quality (int): JPEG quality of the frames.
+            max_bytes (int): Size of frames.bin at which the recording stops, unlimited if None.
+            max_seconds (float): Seconds of stream after which the recording stops, unlimited if None.
+            queue_size (int): Frames waiting to be encoded before write_frame blocks.
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.frames_file = open(self.directory / "frames.bin", 'ab')
+        self.index_file = open(self.directory / "index.jsonl", 'a')
+        self.frame_number = len(read_index(self.directory))
+        self.size = self.frames_file.tell()
+        self.first_time = None
+        self.stopped = False
+        self.frame = None
+        self.entry = None
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer_thread = threading.Thread(target=self._write, daemon=True)
+        self.writer_thread.start()
+
+    def _write(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            frame, entry = item
+
+            ret, encoded = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            if not ret:
+                continue
+
+            entry['offset'] = self.frames_file.tell()
+            entry['length'] = int(encoded.size)
+            self.frames_file.write(encoded.tobytes())
+            self.frames_file.flush()
+            self.index_file.write(json.dumps(entry) + '\n')
+            self.index_file.flush()
+
+            self.size = self.frames_file.tell()
+            if self.max_bytes is not None and self.size >= self.max_bytes:
+                self.stopped = True
+
+    def write_frame(self, frame, capture_time):
+        """
+        Add a frame to the recording. Detections and decisions added afterwards belong to this frame.
+
+        Args:
+            frame (numpy.ndarray): BGR frame, before it is annotated.
+            capture_time (float): Capture timestamp of the frame.
+        """
+        self.flush()
+
+        if self.first_time is None:
+            self.first_time = capture_time
+        if self.max_seconds is not None and capture_time - self.first_time >= self.max_seconds:
+            self.stopped = True
+        if self.stopped:
+            return
+
+        # the engine annotates the frame in place before the writer thread encodes it
+        self.frame = frame.copy()
+        self.entry = {
+            'frame': self.frame_number,
+            'time': capture_time,
+            'detections': {},
+            'schedule': {}
+        }
+        self.frame_number += 1
+
+    def add_detections(self, model, boxes):
+        """
+        Attach the raw output of a model to the last frame.
+
+        Args:
+            model (str): Name of the model ('vehicles' or 'license_plates').
+            boxes (list): Boxes returned by the model, [x1, y1, x2, y2, score, class_id] each.
+        """
+        if self.entry is not None:
+            self.entry['detections'][model] = boxes
+
+    def add_decision(self, stage, allowed):
+        """
+        Attach a decision of the scheduler to the last frame.
+
+        Args:
+            stage (str): Name of the stage.
+            allowed (bool): True if the stage ran, False if it was shed.
+        """
+        if self.entry is not None:
+            self.entry['schedule'].setdefault(stage, []).append(allowed)
+
+    def flush(self):
+        """
+        Hand the last frame and its index entry to the writer thread.
+        """
+        if self.entry is None:
+            return
+        self.queue.put((self.frame, self.entry))
+        self.frame = None
+        self.entry = None
+
+    def close(self):
+        """
+        Write the pending frames and close the files.
+        """
+        self.flush()
+        self.queue.put(None)
+        self.writer_thread.join()
+        self.frames_file.close()
+        self.index_file.close()
+
+
+def read_index(directory):
+    """
+    Read the index of a recording.
+
+    Args:
+        directory (str): Directory of the recording.
+
+    Returns:
+        list: Index entries sorted by frame number.
+    """
+    entries = []
+    with open(Path(directory) / "index.jsonl") as index_file:
+        for line in index_file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                # a partial line left by an interrupted recording
+                break
+    return sorted(entries, key=lambda entry: entry['frame'])
+
+
+def read_frame(frames_file, entry):
+    """
+    Decode a frame of a recording.
+
+    Args:
+        frames_file (file): frames.bin of the recording, opened in binary mode.
+        entry (dict): Index entry of the frame.
+
+    Returns:
+        numpy.ndarray: BGR frame.
+    """
+    frames_file.seek(entry['offset'])
+    data = np.frombuffer(frames_file.read(entry['length']), dtype=np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_COLOR)
+
+
+class Boxes(object):
+    """
+    Boxes of a detection result, as in the results of Ultralytics.
+    """
+
+    def __init__(self, data):
+        self.data = np.array(data, dtype=float).reshape((-1, 6))
+
+
+class Result(object):
+    """
+    Detection result of a stand-in model, with the boxes attribute used by the engine.
+    """
+
+    def __init__(self, data):
+        """
+        Args:
+            data (list): Boxes, [x1, y1, x2, y2, score, class_id] each.
+        """
+        self.boxes = Boxes(data)
+
+
+class RecordedModel(object):
+    """
+    Stand-in for a detection model that returns the detections recorded for the current frame of a replay.
+    """
+
+    def __init__(self, source, model):
+        """
+        Args:
+            source (ReplaySource): Replay whose current frame is being processed.
+            model (str): Name of the recorded model ('vehicles' or 'license_plates').
+        """
+        self.source = source
+        self.model = model
+
+    def __call__(self, frame, **kwargs):
+        return [Result(self.source.current['detections'].get(self.model, []))]
+
+
+class RecordedScheduler(FrameScheduler):
+    """
+    Scheduler that repeats the decisions recorded for the current frame of a replay, so the stages shed
+    while recording are also shed in the replay.
+    """
+
+    def __init__(self, source):
+        """
+        Args:
+            source (ReplaySource): Replay whose current frame is being processed.
+        """
+        super(RecordedScheduler, self).__init__(clock=source.clock)
+        self.source = source
+        self.entry = None
+        self.positions = {}
+
+    def allow(self, stage, capture_time):
+        if stage == 'vehicles':
+            self.frames += 1
+
+        if self.source.current is not self.entry:
+            self.entry = self.source.current
+            self.positions = {}
+        decisions = self.entry.get('schedule', {}).get(stage, [])
+        position = self.positions.get(stage, 0)
+        self.positions[stage] = position + 1
+
+        # stages without a recorded decision ran, as in recordings made without a scheduler
+        if position < len(decisions) and not decisions[position]:
+            self.shed[stage] += 1
+            return False
+        return True
+
+    def record(self, stage, duration):
+        pass
@@ -0,0 +1,130 @@
+"""
+Module containing the deadline-aware scheduling of the processing stages of a frame.
+"""
+import time
+
+
+class FrameScheduler(object):
+    """
+    Decides which stages of a frame can still run within the end-to-end latency deadline.
+
+    Each stage has an estimated cost, initialised with its budget, raised at once by slower
+    measurements and lowered gradually by faster ones. A stage is shed when the age of the frame
+    plus its estimated cost exceeds the deadline. The estimate of a shed stage decays back towards
+    its budget with the time elapsed since it last ran, so under sustained overload the stage is
+    only retried every few seconds.
+    """
+
+    def __init__(self, deadline=0.3, budgets=None, alpha=0.2, recovery_time=5.0, clock=time.monotonic):
+        """
+        Args:
+            deadline (float): Maximum seconds between the capture of a frame and the end of its processing.
+            budgets (dict): Expected seconds of each stage ('vehicles', 'license_plates' and 'ocr').
+            alpha (float): Weight of a faster measurement in the estimated cost of a stage.
+            recovery_time (float): Seconds for the excess of the estimated cost over the budget to halve
+                while a stage is shed.
+            clock (callable): Clock of the capture timestamps, in seconds.
+        """
+        self.deadline = deadline
+        self.budgets = {'vehicles': 0.05, 'license_plates': 0.05, 'ocr': 0.1}
+        if budgets:
+            self.budgets.update(budgets)
+        self.alpha = alpha
+        self.recovery_time = recovery_time
+        self.clock = clock
+        self.costs = dict(self.budgets)
+        self.updated = {stage: None for stage in self.budgets}
+        self.shed = {stage: 0 for stage in self.budgets}
+        self.frames = 0
+        self.completed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def age(self, capture_time):
+        """
+        Get the seconds elapsed since the frame was captured.
+
+        Args:
+            capture_time (float): Capture timestamp of the frame.
+
+        Returns:
+            float: Age of the frame in seconds.
+        """
+        return self.clock() - capture_time
+
+    def allow(self, stage, capture_time):
+        """
+        Check if a stage fits in the time left for the frame, counting it as shed otherwise.
+
+        Args:
+            stage (str): Name of the stage.
+            capture_time (float): Capture timestamp of the frame.
+
+        Returns:
+            bool: True if the stage should run, False if it must be skipped.
+        """
+        if stage == 'vehicles':
+            self.frames += 1
+
+        if self.age(capture_time) + self.costs[stage] <= self.deadline:
+            return True
+
+        self.shed[stage] += 1
+        now = self.clock()
+        if self.updated[stage] is not None:
+            budget = self.budgets[stage]
+            decay = 0.5 ** ((now - self.updated[stage]) / self.recovery_time)
+            self.costs[stage] = budget + (self.costs[stage] - budget) * decay
+        self.updated[stage] = now
+        return False
+
+    def record(self, stage, duration):
+        """
+        Update the estimated cost of a stage with a measured duration.
+
+        Args:
+            stage (str): Name of the stage.
+            duration (float): Measured seconds of the stage.
+        """
+        # a slower run is taken as is, so an overloaded stage backs off at once
+        if duration > self.costs[stage]:
+            self.costs[stage] = duration
+        else:
+            self.costs[stage] += self.alpha * (duration - self.costs[stage])
+        self.updated[stage] = self.clock()
+
+    def drop(self, stage):
+        """
+        Count a task dropped outside the stages of a frame, such as a registration with its queue full.
+
+        Args:
+            stage (str): Name of the task.
+        """
+        self.shed[stage] = self.shed.get(stage, 0) + 1
+
+    def finish(self, capture_time):
+        """
+        Register the end of the processing of a frame.
+
+        Args:
+            capture_time (float): Capture timestamp of the frame.
+        """
+        latency = self.age(capture_time)
+        self.completed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def stats(self):
+        """
+        Get the scheduling statistics.
+
+        Returns:
+            dict: Frames received, shed count of each stage and dropped task, and latency of the processed
+                frames.
+        """
+        return {
+            'frames': self.frames,
+            'shed': dict(self.shed),
+            'mean_latency': self.total_latency / self.completed if self.completed else 0.0,
+            'max_latency': self.max_latency
+        }
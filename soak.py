@@ -0,0 +1,364 @@
+"""
+Soak test that drives the detection engine for hours and reports memory and latency drift.
+
+The vehicle and license plate models and the OCR reader are replaced by stubs, the frames are
+synthetic or looped from a recorded video and the API is a local fake server, so the test runs
+without camera hardware or network access.
+"""
+import os
+import sys
+import cv2
+import json
+import time
+import random
+import string
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import numpy as np
+from pathlib import Path
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import util
+from engine import DetectionEngine
+from event_store import EventStore
+from recording import Result
+from sources import SyntheticSource
+
+
+class FakeModel(object):
+    """
+    Stand-in for an Ultralytics YOLO model that returns the boxes of the synthetic scene.
+    """
+
+    def __init__(self, scene, kind):
+        self.scene = scene
+        self.kind = kind
+
+    def __call__(self, frame, **kwargs):
+        if self.kind == 'vehicle':
+            return [Result(self.scene.vehicle_boxes())]
+        return [Result(self.scene.license_plate_boxes())]
+
+
+class FakeReader(object):
+    """
+    Stand-in for the EasyOCR reader that returns the plate text of the current synthetic vehicle.
+    """
+
+    def __init__(self, scene):
+        self.scene = scene
+
+    def readtext(self, image):
+        text = self.scene.current_plate
+        if text is None:
+            return []
+        return [([[0, 0], [1, 0], [1, 1], [0, 1]], text, 0.9)]
+
+
+class SyntheticScene(SyntheticSource):
+    """
+    Generates frames with one vehicle at a time driving through the entrance side of the image.
+    """
+
+    def __init__(self, frames_per_vehicle=60, video_path=None, **kwargs):
+        super(SyntheticScene, self).__init__(**kwargs)
+        self.frames_per_vehicle = frames_per_vehicle
+        self.current_plate = None
+        self.capture = cv2.VideoCapture(video_path) if video_path else None
+
+    def _random_plate(self):
+        letters = ''.join(random.choice('BCDFGHJKLPRSTVWXYZ') for _ in range(4))
+        digits = ''.join(random.choice(string.digits) for _ in range(2))
+        return letters + digits
+
+    def _vehicle_box(self):
+        step = self.index % self.frames_per_vehicle
+        x1 = 40 + step * 6
+        y1 = self.height // 3 + step * 3
+        return x1, y1, x1 + 420, y1 + 300
+
+    def _grab(self):
+        offset = super(SyntheticScene, self)._grab()
+        if self.index % self.frames_per_vehicle == 0:
+            self.current_plate = self._random_plate()
+        return offset
+
+    def _retrieve(self):
+        frame = None
+        if self.capture is not None:
+            ret, frame = self.capture.read()
+            if not ret:
+                self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                ret, frame = self.capture.read()
+            if ret:
+                frame = cv2.resize(frame, (self.width, self.height))
+        if frame is None:
+            frame = self.background.copy()
+
+        x1, y1, x2, y2 = self._vehicle_box()
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (200, 200, 200), -1)
+        cv2.rectangle(frame, (x1 + 150, y2 - 80), (x1 + 270, y2 - 40), (255, 255, 255), -1)
+        return frame
+
+    def vehicle_boxes(self):
+        x1, y1, x2, y2 = self._vehicle_box()
+        return [[x1, y1, x2, y2, 0.9, 2]]
+
+    def license_plate_boxes(self):
+        x1, y1, x2, y2 = self._vehicle_box()
+        return [[x1 + 150, y2 - 80, x1 + 270, y2 - 40, 0.9, 0]]
+
+
+class _FakeApiHandler(BaseHTTPRequestHandler):
+    posts = 0
+
+    def do_GET(self):
+        self.send_response(200)
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        _FakeApiHandler.posts += 1
+        self.send_response(200)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fake_api():
+    """
+    Start a local HTTP server answering the API endpoints used by util.
+
+    Returns:
+        HTTPServer: Running server, listening on a free local port.
+    """
+    server = HTTPServer(('127.0.0.1', 0), _FakeApiHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+
+def get_rss_mb():
+    """
+    Get the resident set size of the current process.
+
+    Returns:
+        float: Resident set size in megabytes.
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 ** 2
+    except ImportError:
+        pass
+
+    try:
+        with open('/proc/self/statm') as statm:
+            pages = int(statm.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def get_directory_size_mb(directory_path):
+    """
+    Get the total size of the files inside a directory.
+
+    Args:
+        directory_path (str): Path to the directory.
+
+    Returns:
+        float: Size in megabytes.
+    """
+    total = 0
+    for root, _, files in os.walk(directory_path):
+        for filename in files:
+            try:
+                total += os.path.getsize(os.path.join(root, filename))
+            except OSError:
+                pass
+    return total / 1024 ** 2
+
+
+def slope_per_hour(times, values):
+    """
+    Fit a straight line to the samples.
+
+    Args:
+        times (list): Sample times in seconds.
+        values (list): Sample values.
+
+    Returns:
+        float: Slope of the fitted line in units per hour.
+    """
+    if len(times) < 2:
+        return 0.0
+    slope, _ = np.polyfit(np.array(times) / 3600., np.array(values, dtype=float), 1)
+    return float(slope)
+
+
+def top_allocators(snapshot, baseline, limit):
+    """
+    Get the source lines whose allocations grew the most during the test.
+
+    Args:
+        snapshot (tracemalloc.Snapshot): Snapshot at the end of the test.
+        baseline (tracemalloc.Snapshot): Snapshot at the start of the test.
+        limit (int): Number of lines to return.
+
+    Returns:
+        list: Location, current size, size growth in KB and block count of each line.
+    """
+    stats = snapshot.compare_to(baseline, 'lineno')[:limit]
+    return [{'location': str(stat.traceback[0]), 'size_kb': stat.size / 1024,
+             'size_diff_kb': stat.size_diff / 1024, 'count': stat.count} for stat in stats]
+
+
+def run_soak(args):
+    """
+    Run the soak test.
+
+    Args:
+        args (argparse.Namespace): Parsed command line arguments.
+
+    Returns:
+        dict: Drift report.
+    """
+    server = start_fake_api()
+    os.environ['API_URL'] = f"http://127.0.0.1:{server.server_address[1]}"
+    os.environ.setdefault('TOKEN', 'soak')
+
+    scene = SyntheticScene(frames_per_vehicle=args.frames_per_vehicle, video_path=args.video)
+    coco_model = FakeModel(scene, 'vehicle')
+    license_plate_model = FakeModel(scene, 'license_plate')
+    util.reader = FakeReader(scene)
+
+    work_dir = tempfile.mkdtemp(prefix='soak_')
+    os.makedirs(os.path.join(work_dir, 'photos', 'vehicles'))
+    os.makedirs(os.path.join(work_dir, 'photos', 'license_plates'))
+    os.chdir(work_dir)
+
+    engine = DetectionEngine(coco_model, license_plate_model,
+                             event_store=EventStore(os.path.join(work_dir, 'events')), deadline=args.deadline)
+
+    tracemalloc.start(args.traceback_depth)
+    baseline = tracemalloc.take_snapshot()
+
+    samples = []
+    latencies = []
+    frames = 0
+    start = time.perf_counter()
+    next_sample = start + args.sample_interval
+    deadline = start + args.hours * 3600
+
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        for frame, capture_time in scene:
+            if time.perf_counter() >= deadline:
+                break
+
+            frame_start = time.perf_counter()
+            engine.process_frame(frame, capture_time)
+            latencies.append((time.perf_counter() - frame_start) * 1000)
+            frames += 1
+
+            now = time.perf_counter()
+            if now >= next_sample:
+                samples.append({
+                    'elapsed_s': now - start,
+                    'frames': frames,
+                    'rss_mb': get_rss_mb(),
+                    'traced_mb': tracemalloc.get_traced_memory()[0] / 1024 ** 2,
+                    'trackers': len(engine.mot_tracker.trackers),
+                    'photos_mb': get_directory_size_mb('photos'),
+                    'events_mb': get_directory_size_mb('events'),
+                    'latency_mean_ms': float(np.mean(latencies)),
+                    'latency_p95_ms': float(np.percentile(latencies, 95)),
+                    'posts': _FakeApiHandler.posts,
+                    'ocr_cache': engine.ocr_cache.stats(),
+                    'scheduler': engine.scheduler.stats()
+                })
+                print(json.dumps(samples[-1]), file=stdout)
+                latencies = []
+                next_sample = now + args.sample_interval
+    finally:
+        engine.close()
+        sys.stdout.close()
+        sys.stdout = stdout
+        server.shutdown()
+
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    fitted = [sample for sample in samples if sample['elapsed_s'] >= args.warmup]
+    times = [sample['elapsed_s'] for sample in fitted]
+    thresholds = {
+        'rss_mb': args.max_rss_slope,
+        'latency_mean_ms': args.max_latency_slope,
+        'trackers': args.max_tracker_slope,
+        'photos_mb': args.max_photos_slope
+    }
+
+    drift = {}
+    failed = False
+    for metric, threshold in thresholds.items():
+        slope = slope_per_hour(times, [sample[metric] for sample in fitted])
+        exceeded = threshold is not None and slope > threshold
+        failed = failed or exceeded
+        drift[metric] = {'slope_per_hour': slope, 'threshold': threshold, 'exceeded': exceeded}
+
+    return {
+        'duration_s': time.perf_counter() - start,
+        'frames': frames,
+        'work_dir': work_dir,
+        'drift': drift,
+        'top_allocators': top_allocators(snapshot, baseline, args.top),
+        'samples': samples,
+        'failed': failed
+    }
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Soak test of the detection pipeline')
+    parser.add_argument('--hours', help='Duration of the test in hours.', type=float, default=4.0)
+    parser.add_argument('--video', help='Recorded video to loop as background (synthetic if omitted).', type=str)
+    parser.add_argument('--sample_interval', help='Seconds between samples.', type=float, default=60.0)
+    parser.add_argument('--warmup', help='Seconds ignored at the start when fitting the slopes.',
+                        type=float, default=300.0)
+    parser.add_argument('--frames_per_vehicle', help='Frames each synthetic vehicle stays in view.',
+                        type=int, default=60)
+    parser.add_argument('--deadline', help='End-to-end latency deadline of a frame in seconds.',
+                        type=float, default=0.3)
+    parser.add_argument('--max_rss_slope', help='Maximum RSS growth in MB per hour.', type=float, default=5.0)
+    parser.add_argument('--max_latency_slope', help='Maximum frame latency growth in ms per hour.',
+                        type=float, default=1.0)
+    parser.add_argument('--max_tracker_slope', help='Maximum growth of live Sort trackers per hour.',
+                        type=float, default=1.0)
+    parser.add_argument('--max_photos_slope', help='Maximum photos directory growth in MB per hour.',
+                        type=float, default=None)
+    parser.add_argument('--top', help='Number of top allocators to report.', type=int, default=10)
+    parser.add_argument('--traceback_depth', help='Frames kept by tracemalloc per allocation.', type=int, default=1)
+    parser.add_argument('--report', help='Path of the JSON drift report.', type=str, default='soak_report.json')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    args.report = str(Path(args.report).resolve())
+    report = run_soak(args)
+
+    with open(args.report, 'w') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    for metric, result in report['drift'].items():
+        status = 'FALLA' if result['exceeded'] else 'OK'
+        print(f"{metric}: {result['slope_per_hour']:.3f}/h (límite {result['threshold']}) {status}")
+    print(f"Reporte guardado en {args.report}")
+
+    sys.exit(1 if report['failed'] else 0)
@@ -0,0 +1,125 @@
+"""
+    Parallel timing benchmark of SORT on the MOT sequences.
+
+    Every sequence under seq_path/phase runs in a worker process with its own Sort instances.
+    Each update() call is timed with perf_counter_ns and the report gives, per sequence, the frames,
+    the detections, the mean and p99 update() latency and the FPS. With --repeat each sequence is
+    run several times and the median FPS of the runs is reported, to compare tracker changes
+    against a stable baseline.
+"""
+from __future__ import print_function
+
+import os
+import glob
+import json
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from sort import Sort
+from evaluate import load_mot, split_by_frame
+
+
+def benchmark_sequence(seq, seq_dets_fn, tracker_args, repeat, output_dir=None):
+    """
+  Runs the tracker over a sequence repeat times and returns its timing figures.
+  If output_dir is given, the tracker output of the first run is written there in MOT format.
+  """
+    seq_dets = load_mot(seq_dets_fn)
+    num_frames = int(seq_dets[:, 0].max())
+    frames = []
+    for rows in split_by_frame(seq_dets, num_frames):
+        dets = rows[:, 2:7].copy()
+        dets[:, 2:4] += dets[:, 0:2]  # convert to [x1,y1,w,h] to [x1,y1,x2,y2]
+        frames.append(dets)
+
+    latencies = np.empty((repeat, num_frames), dtype=np.int64)
+    output = []
+    for run in range(repeat):
+        mot_tracker = Sort(**tracker_args)
+        for frame, dets in enumerate(frames):
+            start = time.perf_counter_ns()
+            trackers = mot_tracker.update(dets)
+            latencies[run, frame] = time.perf_counter_ns() - start
+            if run == 0 and output_dir is not None:
+                output.append((frame + 1, trackers))
+
+    if output_dir is not None:
+        with open(os.path.join(output_dir, '%s.txt' % seq), 'w') as out_file:
+            for frame, trackers in output:
+                for d in trackers:
+                    print('%d,%d,%.2f,%.2f,%.2f,%.2f,1,-1,-1,-1' % (frame, d[4], d[0], d[1], d[2] - d[0], d[3] - d[1]),
+                          file=out_file)
+
+    run_fps = num_frames / (latencies.sum(axis=1) / 1e9)
+    return {
+        'sequence': seq,
+        'frames': num_frames,
+        'detections': int(len(seq_dets)),
+        'repeat': repeat,
+        'mean_ms': float(latencies.mean() / 1e6),
+        'p99_ms': float(np.percentile(latencies, 99) / 1e6),
+        'fps': float(np.median(run_fps)),
+        'fps_min': float(run_fps.min()),
+        'fps_max': float(run_fps.max())
+    }
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='SORT parallel timing benchmark')
+    parser.add_argument("--seq_path", help="Path to detections.", type=str, default='data')
+    parser.add_argument("--phase", help="Subdirectory in seq_path.", type=str, default='train')
+    parser.add_argument("--max_age",
+                        help="Maximum number of frames to keep alive a track without associated detections.",
+                        type=int, default=1)
+    parser.add_argument("--min_hits",
+                        help="Minimum number of associated detections before track is initialised.",
+                        type=int, default=3)
+    parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    parser.add_argument("--det_thresh",
+                        help="Score below which detections only extend existing tracks (disabled if omitted).",
+                        type=float, default=None)
+    parser.add_argument("--low_iou_threshold", help="Minimum IOU for match of low score detections.",
+                        type=float, default=0.5)
+    parser.add_argument("--repeat", help="Runs of each sequence.", type=int, default=1)
+    parser.add_argument("--workers", help="Worker processes [number of CPUs].", type=int, default=None)
+    parser.add_argument("--output_dir", help="Directory for the tracker output (not written if omitted).",
+                        type=str, default=None)
+    parser.add_argument("--json", dest='json', help="Print the report as JSON.", action='store_true')
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    tracker_args = {'max_age': args.max_age, 'min_hits': args.min_hits, 'iou_threshold': args.iou_threshold,
+                    'det_thresh': args.det_thresh, 'low_iou_threshold': args.low_iou_threshold}
+    if args.output_dir is not None and not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    pattern = os.path.join(args.seq_path, args.phase, '*', 'det', 'det.txt')
+    sequences = [(seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0], seq_dets_fn)
+                 for seq_dets_fn in sorted(glob.glob(pattern))]
+
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(benchmark_sequence, seq, seq_dets_fn, tracker_args, args.repeat, args.output_dir)
+                   for seq, seq_dets_fn in sequences]
+        results = [future.result() for future in futures]
+
+    frames = sum(r['frames'] for r in results)
+    total_time = sum(r['frames'] / r['fps'] for r in results)
+    summary = {'frames': frames, 'detections': sum(r['detections'] for r in results),
+               'fps': frames / total_time if total_time else 0.}
+
+    if args.json:
+        print(json.dumps({'tracker': tracker_args, 'repeat': args.repeat, 'sequences': results,
+                          'summary': summary}, indent=2))
+    else:
+        print('%-16s %7s %7s %9s %9s %9s' % ('sequence', 'frames', 'dets', 'mean ms', 'p99 ms', 'FPS'))
+        for r in results:
+            print('%-16s %7d %7d %9.3f %9.3f %9.1f' % (
+                r['sequence'], r['frames'], r['detections'], r['mean_ms'], r['p99_ms'], r['fps']))
+        print('%-16s %7d %7d %9s %9s %9.1f' % ('OVERALL', summary['frames'], summary['detections'], '', '',
+                                               summary['fps']))
@@ -0,0 +1,249 @@
+"""
+    Speed and accuracy benchmark of SORT on the MOT sequences.
+
+    Runs the tracker on every sequence under seq_path/phase, measures the update() time and,
+    when the ground truth of the sequence is available in MOT format (gt_path/phase/<seq>/gt/gt.txt),
+    computes MOTA, IDF1 and ID switches. The report can be compared against a previous one to be
+    used as a regression gate.
+"""
+from __future__ import print_function
+
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import numpy as np
+
+from sort import Sort, iou_batch, linear_assignment
+
+
+def load_mot(path, min_conf=None):
+    """
+  Loads a MOT format file and returns it sorted by frame.
+  If min_conf is given, rows whose confidence column is below it are dropped.
+  """
+    data = np.loadtxt(path, delimiter=',', ndmin=2)
+    if min_conf is not None:
+        data = data[data[:, 6] >= min_conf]
+    return data[np.argsort(data[:, 0], kind='stable')]
+
+
+def split_by_frame(data, num_frames):
+    """
+  Returns a list with the rows of each frame, index 0 is frame 1.
+  """
+    bounds = np.searchsorted(data[:, 0], np.arange(1, num_frames + 2))
+    return [data[bounds[f]:bounds[f + 1]] for f in range(num_frames)]
+
+
+def to_xyxy(rows):
+    boxes = rows[:, 2:6].copy()
+    boxes[:, 2:4] += boxes[:, 0:2]
+    return boxes
+
+
+def run_tracker(seq_dets, tracker_args):
+    """
+  Runs a new SORT instance over the detections of a sequence.
+  Returns the tracker output in MOT format, the number of frames and the time spent in update().
+  """
+    mot_tracker = Sort(**tracker_args)
+    num_frames = int(seq_dets[:, 0].max())
+    frames = split_by_frame(seq_dets, num_frames)
+    output = []
+    total_time = 0.0
+    for frame, rows in enumerate(frames, start=1):
+        dets = rows[:, 2:7].copy()
+        dets[:, 2:4] += dets[:, 0:2]
+
+        start_time = time.perf_counter()
+        trackers = mot_tracker.update(dets)
+        total_time += time.perf_counter() - start_time
+
+        for d in trackers:
+            output.append([frame, d[4], d[0], d[1], d[2] - d[0], d[3] - d[1]])
+    return np.array(output).reshape((-1, 6)), num_frames, total_time
+
+
+def evaluate_sequence(gt, hyp, iou_threshold=0.5):
+    """
+  Computes the CLEAR MOT and identity metrics of a tracker output against the ground truth.
+  Both arrays are in MOT format and sorted by frame.
+  Returns a dict with MOTA, IDF1, ID switches and the raw counts.
+  """
+    num_frames = int(max(gt[:, 0].max() if len(gt) else 0, hyp[:, 0].max() if len(hyp) else 0))
+    gt_frames = split_by_frame(gt, num_frames)
+    hyp_frames = split_by_frame(hyp, num_frames)
+
+    gt_ids, gt_index = np.unique(gt[:, 1].astype(int), return_inverse=True)
+    hyp_ids, hyp_index = np.unique(hyp[:, 1].astype(int), return_inverse=True)
+    gt_bounds = np.searchsorted(gt[:, 0], np.arange(1, num_frames + 2))
+    hyp_bounds = np.searchsorted(hyp[:, 0], np.arange(1, num_frames + 2))
+
+    # co-occurrence counts of (gt id, hyp id) pairs overlapping above the threshold, for IDF1
+    overlaps = np.zeros((len(gt_ids), len(hyp_ids)), dtype=np.int64)
+
+    matches = 0
+    switches = 0
+    last_match = {}
+    for f in range(num_frames):
+        g_rows, h_rows = gt_frames[f], hyp_frames[f]
+        if len(g_rows) == 0 or len(h_rows) == 0:
+            continue
+        g_idx = gt_index[gt_bounds[f]:gt_bounds[f + 1]]
+        h_idx = hyp_index[hyp_bounds[f]:hyp_bounds[f + 1]]
+
+        iou = iou_batch(to_xyxy(g_rows), to_xyxy(h_rows))
+        valid = iou >= iou_threshold
+        gi, hi = np.nonzero(valid)
+        np.add.at(overlaps, (g_idx[gi], h_idx[hi]), 1)
+
+        # keep the correspondences of the previous frame when still valid, as CLEAR MOT requires
+        cost = np.where(valid, 1. - iou, 2.)
+        previous = np.array([last_match.get(g, -1) for g in g_idx])
+        cost[(previous[:, None] == h_idx[None, :]) & valid] -= 2.
+        pairs = linear_assignment(cost) if min(cost.shape) > 0 else np.empty((0, 2), dtype=int)
+        pairs = np.asarray(pairs, dtype=int).reshape((-1, 2))
+        pairs = pairs[valid[pairs[:, 0], pairs[:, 1]]]
+
+        matches += len(pairs)
+        for g, h in zip(g_idx[pairs[:, 0]], h_idx[pairs[:, 1]]):
+            if g in last_match and last_match[g] != h:
+                switches += 1
+            last_match[g] = h
+
+    num_gt = len(gt)
+    num_hyp = len(hyp)
+    misses = num_gt - matches
+    false_positives = num_hyp - matches
+
+    if overlaps.size > 0:
+        # identity matching: pairing ids minimises IDFN + IDFP, which is maximising the shared detections
+        id_pairs = np.asarray(linear_assignment(-overlaps), dtype=int).reshape((-1, 2))
+        idtp = int(overlaps[id_pairs[:, 0], id_pairs[:, 1]].sum())
+    else:
+        idtp = 0
+
+    return {
+        'gt': num_gt,
+        'hyp': num_hyp,
+        'matches': int(matches),
+        'misses': int(misses),
+        'false_positives': int(false_positives),
+        'id_switches': int(switches),
+        'idtp': idtp,
+        'mota': 1. - (misses + false_positives + switches) / num_gt if num_gt else 0.,
+        'idf1': 2. * idtp / (num_gt + num_hyp) if num_gt + num_hyp else 0.
+    }
+
+
+def summarize(results):
+    """
+  Combines the per-sequence results into overall speed and accuracy figures.
+  """
+    frames = sum(r['frames'] for r in results)
+    total_time = sum(r['time'] for r in results)
+    summary = {'frames': frames, 'time': total_time, 'fps': frames / total_time if total_time else 0.}
+    evaluated = [r for r in results if 'mota' in r]
+    if evaluated:
+        counts = {key: sum(r[key] for r in evaluated)
+                  for key in ('gt', 'hyp', 'misses', 'false_positives', 'id_switches', 'idtp')}
+        summary.update(counts)
+        summary['mota'] = 1. - (counts['misses'] + counts['false_positives'] + counts['id_switches']) / counts['gt']
+        summary['idf1'] = 2. * counts['idtp'] / (counts['gt'] + counts['hyp'])
+    return summary
+
+
+def check_regression(summary, baseline, args):
+    """
+  Compares the summary with a baseline report. Returns the list of failed checks.
+  """
+    failures = []
+    if 'mota' in summary and 'mota' in baseline:
+        if baseline['mota'] - summary['mota'] > args.max_mota_drop:
+            failures.append('MOTA %.4f < %.4f' % (summary['mota'], baseline['mota']))
+        if baseline['idf1'] - summary['idf1'] > args.max_idf1_drop:
+            failures.append('IDF1 %.4f < %.4f' % (summary['idf1'], baseline['idf1']))
+        if summary['id_switches'] - baseline['id_switches'] > args.max_idsw_increase:
+            failures.append('IDSW %d > %d' % (summary['id_switches'], baseline['id_switches']))
+    if args.max_fps_drop is not None and summary['fps'] < baseline['fps'] * (1. - args.max_fps_drop):
+        failures.append('FPS %.1f < %.1f' % (summary['fps'], baseline['fps']))
+    return failures
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='SORT speed and accuracy benchmark')
+    parser.add_argument("--seq_path", help="Path to detections.", type=str, default='data')
+    parser.add_argument("--gt_path", help="Path to the MOT benchmark with the ground truth.", type=str,
+                        default='mot_benchmark')
+    parser.add_argument("--phase", help="Subdirectory in seq_path.", type=str, default='train')
+    parser.add_argument("--max_age",
+                        help="Maximum number of frames to keep alive a track without associated detections.",
+                        type=int, default=1)
+    parser.add_argument("--min_hits",
+                        help="Minimum number of associated detections before track is initialised.",
+                        type=int, default=3)
+    parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    parser.add_argument("--det_thresh",
+                        help="Score below which detections only extend existing tracks (disabled if omitted).",
+                        type=float, default=None)
+    parser.add_argument("--low_iou_threshold", help="Minimum IOU for match of low score detections.",
+                        type=float, default=0.5)
+    parser.add_argument("--eval_iou", help="Minimum IOU between output and ground truth.", type=float, default=0.5)
+    parser.add_argument("--output", help="Path of the JSON report.", type=str, default=None)
+    parser.add_argument("--baseline", help="JSON report to compare against.", type=str, default=None)
+    parser.add_argument("--max_mota_drop", help="Allowed MOTA decrease against the baseline.", type=float,
+                        default=0.005)
+    parser.add_argument("--max_idf1_drop", help="Allowed IDF1 decrease against the baseline.", type=float,
+                        default=0.005)
+    parser.add_argument("--max_idsw_increase", help="Allowed ID switches increase against the baseline.",
+                        type=int, default=0)
+    parser.add_argument("--max_fps_drop", help="Allowed relative FPS decrease against the baseline.",
+                        type=float, default=None)
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    tracker_args = {'max_age': args.max_age, 'min_hits': args.min_hits, 'iou_threshold': args.iou_threshold,
+                    'det_thresh': args.det_thresh, 'low_iou_threshold': args.low_iou_threshold}
+
+    results = []
+    pattern = os.path.join(args.seq_path, args.phase, '*', 'det', 'det.txt')
+    for seq_dets_fn in sorted(glob.glob(pattern)):
+        seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
+        hyp, frames, total_time = run_tracker(load_mot(seq_dets_fn), tracker_args)
+        result = {'sequence': seq, 'frames': frames, 'time': total_time,
+                  'fps': frames / total_time if total_time else 0.}
+
+        gt_fn = os.path.join(args.gt_path, args.phase, seq, 'gt', 'gt.txt')
+        if os.path.exists(gt_fn):
+            result.update(evaluate_sequence(load_mot(gt_fn, min_conf=1), hyp, args.eval_iou))
+            print('%-16s %6d frames %8.1f FPS  MOTA %6.3f  IDF1 %6.3f  IDSW %4d' % (
+                seq, frames, result['fps'], result['mota'], result['idf1'], result['id_switches']))
+        else:
+            print('%-16s %6d frames %8.1f FPS  (no ground truth at %s)' % (seq, frames, result['fps'], gt_fn))
+        results.append(result)
+
+    summary = summarize(results)
+    if 'mota' in summary:
+        print('%-16s %6d frames %8.1f FPS  MOTA %6.3f  IDF1 %6.3f  IDSW %4d' % (
+            'OVERALL', summary['frames'], summary['fps'], summary['mota'], summary['idf1'], summary['id_switches']))
+    else:
+        print('%-16s %6d frames %8.1f FPS' % ('OVERALL', summary['frames'], summary['fps']))
+
+    report = {'tracker': tracker_args, 'sequences': results, 'summary': summary}
+    if args.output:
+        with open(args.output, 'w') as out_file:
+            json.dump(report, out_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            failures = check_regression(summary, json.load(baseline_file)['summary'], args)
+        for failure in failures:
+            print('REGRESSION: %s' % failure)
+        sys.exit(1 if failures else 0)
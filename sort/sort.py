@@ -203,13 +203,18 @@ def associate_detections_to_trackers(detections, trackers, iou_threshold=0.3):
 
 
 class Sort(object):
-    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3):
+    def __init__(self, max_age=1, min_hits=3, iou_threshold=0.3, det_thresh=None, low_iou_threshold=0.5):
         """
     Sets key parameters for SORT
+    If det_thresh is set, detections scoring below it are only used in a second association stage
+    (as in ByteTrack) to keep alive the tracks left unmatched by the high score detections, and never
+    start new tracks.
     """
         self.max_age = max_age
         self.min_hits = min_hits
         self.iou_threshold = iou_threshold
+        self.det_thresh = det_thresh
+        self.low_iou_threshold = low_iou_threshold
         self.trackers = []
         self.frame_count = 0
 
@@ -236,12 +241,27 @@ class Sort(object):
         trks = np.ma.compress_rows(np.ma.masked_invalid(trks))
         for t in reversed(to_del):
             self.trackers.pop(t)
+        if self.det_thresh is not None:
+            # frames without detections may come as a 1-D empty array
+            dets = np.asarray(dets)
+            dets = dets.reshape((-1, dets.shape[1] if dets.ndim == 2 else 5))
+            low = dets[:, 4] < self.det_thresh
+            dets_low = dets[low]
+            dets = dets[~low]
         matched, unmatched_dets, unmatched_trks = associate_detections_to_trackers(dets, trks, self.iou_threshold)
 
         # update matched trackers with assigned detections
         for m in matched:
             self.trackers[m[1]].update(dets[m[0], :])
 
+        # second association of the low score detections with the trackers left unmatched
+        if self.det_thresh is not None and len(dets_low) > 0 and len(unmatched_trks) > 0:
+            unmatched_trks = unmatched_trks.astype(int)
+            matched_low, _, _ = associate_detections_to_trackers(dets_low, trks[unmatched_trks],
+                                                                 self.low_iou_threshold)
+            for m in matched_low:
+                self.trackers[unmatched_trks[m[1]]].update(dets_low[m[0], :])
+
         # create and initialise new trackers for unmatched detections
         for i in unmatched_dets:
             trk = KalmanBoxTracker(dets[i, :])
@@ -274,6 +294,11 @@ def parse_args():
                         help="Minimum number of associated detections before track is initialised.",
                         type=int, default=3)
     parser.add_argument("--iou_threshold", help="Minimum IOU for match.", type=float, default=0.3)
+    parser.add_argument("--det_thresh",
+                        help="Score below which detections only extend existing tracks (disabled if omitted).",
+                        type=float, default=None)
+    parser.add_argument("--low_iou_threshold", help="Minimum IOU for match of low score detections.",
+                        type=float, default=0.5)
     args = parser.parse_args()
     return args
 
@@ -305,7 +330,9 @@ if __name__ == '__main__':
     for seq_dets_fn in glob.glob(pattern):
         mot_tracker = Sort(max_age=args.max_age,
                            min_hits=args.min_hits,
-                           iou_threshold=args.iou_threshold)  # create instance of the SORT tracker
+                           iou_threshold=args.iou_threshold,
+                           det_thresh=args.det_thresh,
+                           low_iou_threshold=args.low_iou_threshold)  # create instance of the SORT tracker
         seq_dets = np.loadtxt(seq_dets_fn, delimiter=',')
         seq = seq_dets_fn[pattern.find('*'):].split(os.path.sep)[0]
 
@@ -0,0 +1,254 @@
+"""
+Module containing the frame sources of the detection engine.
+
+Every source is iterable and yields (frame, capture_time) pairs, with capture_time in the clock of
+the source. In real-time mode the file based sources are paced at their nominal frame rate and the
+frames that are already late are dropped before decoding them. In free-running mode every frame is
+returned as fast as it can be read.
+"""
+import cv2
+import time
+import numpy as np
+from pathlib import Path
+
+from recording import read_index, read_frame
+
+
+class FrameSource(object):
+    """
+    Base class of the frame sources.
+
+    Subclasses implement _grab, which advances to the next frame and returns its offset in seconds
+    from the start of the stream (None at the end), and _retrieve, which returns the frame grabbed.
+    """
+
+    def __init__(self, realtime=False, max_lateness=0.1):
+        """
+        Args:
+            realtime (bool): Pace the frames at their nominal rate and drop the late ones.
+            max_lateness (float): Seconds a frame can be late before it is dropped in real-time mode.
+        """
+        self.realtime = realtime
+        self.max_lateness = max_lateness
+        self.clock = time.monotonic
+        self.frames = 0
+        self.dropped = 0
+        self.start = None
+
+    def _grab(self):
+        raise NotImplementedError
+
+    def _retrieve(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        while True:
+            offset = self._grab()
+            if offset is None:
+                return
+            self.frames += 1
+            now = self.clock()
+
+            if not self.realtime:
+                capture_time = now
+            else:
+                if self.start is None:
+                    self.start = now - offset
+                capture_time = self.start + offset
+                if now < capture_time:
+                    time.sleep(capture_time - now)
+                elif now - capture_time > self.max_lateness:
+                    self.dropped += 1
+                    continue
+
+            frame = self._retrieve()
+            if frame is None:
+                return
+            yield frame, capture_time
+
+    def close(self):
+        """
+        Release the resources of the source.
+        """
+        pass
+
+
+class OakSource(FrameSource):
+    """
+    Frames of the color camera of an OAK device, always in real time.
+    """
+
+    def __init__(self, width=1920, height=1080, fps=40):
+        """
+        Args:
+            width (int): Width of the frames.
+            height (int): Height of the frames.
+            fps (int): Frame rate of the camera.
+        """
+        super(OakSource, self).__init__(realtime=True)
+        import depthai as dai
+
+        self.dai = dai
+        self.clock = lambda: dai.Clock.now().total_seconds()
+
+        self.pipeline = dai.Pipeline()
+
+        camRgb = self.pipeline.create(dai.node.ColorCamera)
+        xoutVideo = self.pipeline.create(dai.node.XLinkOut)
+
+        xoutVideo.setStreamName("video")
+
+        camRgb.setBoardSocket(dai.CameraBoardSocket.CAM_A)
+        camRgb.setResolution(dai.ColorCameraProperties.SensorResolution.THE_1080_P)
+        camRgb.setVideoSize(width, height)
+        camRgb.setFps(fps)
+
+        xoutVideo.input.setBlocking(False)
+        xoutVideo.input.setQueueSize(1)
+
+        camRgb.video.link(xoutVideo.input)
+
+    def __iter__(self):
+        with self.dai.Device(self.pipeline) as device:
+            video = device.getOutputQueue(name="video", maxSize=1, blocking=False)
+            while True:
+                videoIn = video.get()
+                self.frames += 1
+                yield videoIn.getCvFrame(), videoIn.getTimestamp().total_seconds()
+
+
+class VideoSource(FrameSource):
+    """
+    Frames of a video file.
+    """
+
+    def __init__(self, path, loop=False, **kwargs):
+        """
+        Args:
+            path (str): Path to the video file.
+            loop (bool): Start again from the first frame at the end of the video.
+        """
+        super(VideoSource, self).__init__(**kwargs)
+        self.cap = cv2.VideoCapture(str(path))
+        self.loop = loop
+        self.loop_offset = 0.0
+        self.last_offset = 0.0
+
+    def _grab(self):
+        if not self.cap.grab():
+            if not self.loop:
+                return None
+            self.loop_offset = self.last_offset
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            if not self.cap.grab():
+                return None
+        self.last_offset = self.loop_offset + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000
+        return self.last_offset
+
+    def _retrieve(self):
+        ret, frame = self.cap.retrieve()
+        return frame if ret else None
+
+    def close(self):
+        self.cap.release()
+
+
+class ImageDirectorySource(FrameSource):
+    """
+    Image files of a directory, in name order.
+    """
+
+    def __init__(self, directory, fps=10, **kwargs):
+        """
+        Args:
+            directory (str): Directory with the images.
+            fps (float): Nominal frame rate of the images.
+        """
+        super(ImageDirectorySource, self).__init__(**kwargs)
+        self.paths = sorted(path for path in Path(directory).iterdir()
+                            if path.suffix.lower() in ('.jpg', '.jpeg', '.png', '.bmp'))
+        self.fps = fps
+        self.index = -1
+
+    def _grab(self):
+        self.index += 1
+        if self.index >= len(self.paths):
+            return None
+        return self.index / self.fps
+
+    def _retrieve(self):
+        return cv2.imread(str(self.paths[self.index]))
+
+
+class SyntheticSource(FrameSource):
+    """
+    Generated frames, for benchmarks that do not depend on the content of the image.
+    """
+
+    def __init__(self, width=1920, height=1080, fps=40, count=None, **kwargs):
+        """
+        Args:
+            width (int): Width of the frames.
+            height (int): Height of the frames.
+            fps (float): Nominal frame rate.
+            count (int): Number of frames, endless if None.
+        """
+        super(SyntheticSource, self).__init__(**kwargs)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.count = count
+        self.index = -1
+        self.background = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+
+    def _grab(self):
+        self.index += 1
+        if self.count is not None and self.index >= self.count:
+            return None
+        return self.index / self.fps
+
+    def _retrieve(self):
+        return self.background.copy()
+
+
+class ReplaySource(FrameSource):
+    """
+    Frames of a recording, at the original pace in real-time mode.
+    """
+
+    def __init__(self, directory, start_frame=0, **kwargs):
+        """
+        Args:
+            directory (str): Directory of the recording.
+            start_frame (int): Number of the first frame to replay.
+        """
+        super(ReplaySource, self).__init__(**kwargs)
+        self.entries = read_index(directory)
+        self.frames_file = open(Path(directory) / "frames.bin", 'rb')
+        self.position = -1
+        self.current = None
+        self.seek(start_frame)
+
+    def seek(self, frame_number):
+        """
+        Move to a frame, the next one returned is the one with that number.
+
+        Args:
+            frame_number (int): Frame number in the recording.
+        """
+        numbers = [entry['frame'] for entry in self.entries]
+        self.position = int(np.searchsorted(numbers, frame_number)) - 1
+        self.start = None
+
+    def _grab(self):
+        self.position += 1
+        if self.position >= len(self.entries):
+            return None
+        self.current = self.entries[self.position]
+        return self.current['time'] - self.entries[0]['time']
+
+    def _retrieve(self):
+        return read_frame(self.frames_file, self.current)
+
+    def close(self):
+        self.frames_file.close()
@@ -0,0 +1,254 @@
+"""
+Module containing the CPU thread budget of the processing stages and the warm-up of the models.
+
+Run as a script to sweep the thread count of each stage on the current machine:
+
+    python startup.py --runs 20
+"""
+import os
+import cv2
+import time
+import argparse
+import numpy as np
+from contextlib import contextmanager
+
+try:
+    import torch
+except ImportError:
+    torch = None
+
+from threadpoolctl import threadpool_limits
+
+STAGES = ('vehicles', 'license_plates', 'ocr')
+
+
+def parse_cpus(text):
+    """
+    Parse a CPU list such as "0-3,6".
+
+    Args:
+        text (str): Comma separated CPU numbers or ranges.
+
+    Returns:
+        set: CPU numbers.
+    """
+    cpus = set()
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return cpus
+
+
+def available_cpus(cpus=None):
+    """
+    Count the CPUs the process can run on.
+
+    Args:
+        cpus (set): CPUs the process is going to be pinned to, the current affinity if None.
+
+    Returns:
+        int: Number of CPUs.
+    """
+    if cpus:
+        return len(cpus)
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count()
+
+
+class ThreadBudget(object):
+    """
+    Explicit thread counts for the Torch stages, OpenCV and BLAS, and the optional CPU affinity.
+    """
+
+    def __init__(self, threads=None, cpus=None):
+        """
+        Args:
+            threads (dict): Threads of each stage ('vehicles', 'license_plates', 'ocr'), of 'opencv' and of 'blas'.
+            cpus (set): CPUs the process is pinned to, all of them if None.
+        """
+        available = available_cpus(cpus)
+        self.threads = {stage: available for stage in STAGES}
+        self.threads.update({'opencv': 1, 'blas': 1})
+        if threads:
+            self.threads.update(threads)
+        self.cpus = cpus
+
+    @classmethod
+    def from_env(cls):
+        """
+        Create the budget from the THREADS and CPU_AFFINITY environment variables.
+
+        THREADS has the form "vehicles=2,license_plates=2,ocr=4,opencv=1,blas=1" and CPU_AFFINITY
+        the form "0-3".
+
+        Returns:
+            ThreadBudget: Budget with the configured values.
+        """
+        threads = {}
+        for part in os.getenv("THREADS", "").split(','):
+            if '=' in part:
+                name, value = part.split('=')
+                threads[name.strip()] = int(value)
+        cpus = os.getenv("CPU_AFFINITY")
+        return cls(threads, parse_cpus(cpus) if cpus else None)
+
+    def apply(self):
+        """
+        Apply the process wide settings: CPU affinity, OpenCV threads and BLAS threads.
+        """
+        if self.cpus and hasattr(os, 'sched_setaffinity'):
+            os.sched_setaffinity(0, self.cpus)
+
+        cv2.setNumThreads(self.threads['opencv'])
+
+        # numpy is already imported here, so the BLAS pools are resized at runtime instead of through
+        # OMP_NUM_THREADS and friends, which are only read when the library loads
+        threadpool_limits(limits=self.threads['blas'], user_api='blas')
+
+        if torch is not None:
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Run a block with the Torch thread count of a stage.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        if torch is None:
+            yield
+            return
+
+        previous = torch.get_num_threads()
+        torch.set_num_threads(self.threads[name])
+        try:
+            yield
+        finally:
+            torch.set_num_threads(previous)
+
+
+def measure(function, runs):
+    """
+    Measure the steady state latency of a function.
+
+    Args:
+        function (callable): Function to call without arguments.
+        runs (int): Number of timed calls, after one untimed call.
+
+    Returns:
+        float: Median latency in milliseconds.
+    """
+    function()
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return float(np.median(latencies))
+
+
+def stage_functions(coco_model, license_plate_model, shape=(1080, 1920, 3)):
+    """
+    Build the dummy inference of each stage.
+
+    Args:
+        coco_model (YOLO): Vehicle detection model.
+        license_plate_model (YOLO): License plate detection model.
+        shape (tuple): Shape of the dummy frames.
+
+    Returns:
+        dict: Function of each stage.
+    """
+    from util import read_license_plate
+
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 255, shape, dtype=np.uint8)
+    crop = rng.integers(0, 255, (60, 180), dtype=np.uint8)
+
+    return {
+        'vehicles': lambda: coco_model(frame, verbose=False),
+        'license_plates': lambda: license_plate_model(frame, verbose=False),
+        'ocr': lambda: read_license_plate(crop)
+    }
+
+
+def warm_up(budget, coco_model, license_plate_model, runs=5):
+    """
+    Run dummy inferences of every stage so the models are initialised before the first real frame.
+
+    Args:
+        budget (ThreadBudget): Thread budget of the stages.
+        coco_model (YOLO): Vehicle detection model.
+        license_plate_model (YOLO): License plate detection model.
+        runs (int): Number of timed inferences of each stage.
+
+    Returns:
+        dict: Steady state latency of each stage in milliseconds.
+    """
+    latencies = {}
+    for name, function in stage_functions(coco_model, license_plate_model).items():
+        with budget.stage(name):
+            latencies[name] = measure(function, runs)
+        print(f"Etapa {name}: {latencies[name]:.1f} ms con {budget.threads[name]} hilos")
+    return latencies
+
+
+def sweep(budget, coco_model, license_plate_model, runs):
+    """
+    Find the thread count with the lowest latency for each stage.
+
+    The stages run one after the other, so each one is swept independently.
+
+    Args:
+        budget (ThreadBudget): Budget whose thread counts are replaced by the best ones.
+        coco_model (YOLO): Vehicle detection model.
+        license_plate_model (YOLO): License plate detection model.
+        runs (int): Number of timed inferences of each configuration.
+
+    Returns:
+        dict: Latency in milliseconds of each thread count of each stage.
+    """
+    available = available_cpus(budget.cpus)
+    candidates = sorted({1, 2, available // 2, available} - {0})
+
+    results = {}
+    for name, function in stage_functions(coco_model, license_plate_model).items():
+        results[name] = {}
+        for threads in candidates:
+            budget.threads[name] = threads
+            with budget.stage(name):
+                results[name][threads] = measure(function, runs)
+            print(f"Etapa {name}: {results[name][threads]:.1f} ms con {threads} hilos")
+        budget.threads[name] = min(results[name], key=results[name].get)
+    return results
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='Thread count sweep of the processing stages')
+    parser.add_argument('--runs', help='Timed inferences of each configuration.', type=int, default=20)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    from ultralytics import YOLO
+
+    args = parse_args()
+    budget = ThreadBudget.from_env()
+    budget.apply()
+
+    sweep(budget, YOLO('model/yolov8n.pt'), YOLO('model/best.pt'), args.runs)
+
+    threads = ','.join(f"{name}={value}" for name, value in budget.threads.items())
+    print(f"Configuración recomendada: THREADS={threads}")
@@ -1,130 +1,85 @@
 """
 Main script for processing license plate detection and recognition with video.
-"""
-import cv2
-import sys
-from sort.sort import *
-from pathlib import Path
-from ultralytics import YOLO
-from datetime import datetime
-
-from util import (
-    get_vehicles,
-    read_license_plate,
-    delete_files_in_directory,
-    similarity_percentage,
-)
 
-mot_tracker = Sort()
+The frames can also come from a directory of images, a recording made with main.py --record or be
+generated, and with --fast they are processed as fast as possible instead of in real time, to
+benchmark without the camera.
+"""
+import argparse
+
+from startup import ThreadBudget
+from event_store import EventStore
+from recording import RecordedModel, RecordedScheduler
+from engine import DetectionEngine, load_models
+from sources import VideoSource, ImageDirectorySource, SyntheticSource, ReplaySource
+
+
+def parse_args():
+    """Parse input arguments."""
+    parser = argparse.ArgumentParser(description='License plate detection on a video')
+    parser.add_argument('model', help='Path to the vehicle detection model.', nargs='?', default=None)
+    parser.add_argument('--video', help='Video file to process.', type=str, default='video.mp4')
+    parser.add_argument('--images', help='Directory of images to process instead of the video.', type=str)
+    parser.add_argument('--replay', help='Recording to process instead of the video.', type=str)
+    parser.add_argument('--start_frame', help='First frame of the recording to process.', type=int, default=0)
+    parser.add_argument('--recorded_detections',
+                        help='Use the detections and the shed stages of the recording instead of the models.',
+                        action='store_true')
+    parser.add_argument('--synthetic', help='Number of generated frames to process instead of the video.',
+                        type=int)
+    parser.add_argument('--fps', help='Frame rate of the images and the generated frames.', type=float, default=10)
+    parser.add_argument('--fast', help='Process the frames as fast as possible, without dropping any.',
+                        action='store_true')
+    parser.add_argument('--no_display', help='Do not show the frames.', action='store_true')
+    parser.add_argument('--max_age', help='Frames a track is kept without detections.', type=int, default=5)
+    parser.add_argument('--det_thresh', help='Score needed to start a track, 0 lets every detection start one.',
+                        type=float, default=0.25)
+    parser.add_argument('--events', help='Directory of an event store for the detections, none if omitted.',
+                        type=str, default=None)
+    return parser.parse_args()
 
 
 def main():
     """
     Main function of the script.
     """
-
-    cap = cv2.VideoCapture("video.mp4")
-    current_time = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-    last_checked_hour = None
-
-    model_path = Path(__file__).parent / "model" / "yolov8n.pt"
-    license_plate_path = Path(__file__).parent / "model" / "best.pt"
-
-    nnPath = sys.argv[1] if len(sys.argv) > 1 else str(model_path)
-
-    if not Path(nnPath).exists():
-        raise FileNotFoundError(f'El modelo requerido no se encuentra en {nnPath}')
-
-    if not license_plate_path.exists():
-        raise FileNotFoundError(f'El modelo de placa de licencia no se encuentra en {license_plate_path}')
-
-    coco_model = YOLO('model/yolov8n.pt')
-    license_plate_model = YOLO('model/best.pt')
-
-    vehicles = [2, 7]
-    last_license_plate = None
-
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-
-        detections = coco_model(frame)[0]
-        detections_ = []
-
-        for detection in detections.boxes.data.tolist():
-            x1, y1, x2, y2, conf, class_id = detection
-            if int(class_id) in vehicles:
-                detections_.append([x1, y1, x2, y2, conf, class_id])
-
-        vehicles_ids = mot_tracker.update(np.array(detections_))
-
-        width = frame.shape[1]
-        mid_width = width // 2
-
-        width_entrance = mid_width - 400
-        width_exit = mid_width + 400
-
-        license_plates = license_plate_model(frame)[0]
-        for license_plate in license_plates.boxes.data.tolist():
-            x1, y1, x2, y2, score, class_id = license_plate
-            if x1 < width_entrance or x1 > width_exit and score > 0.75:
-                xvehi1, yvehi1, xvehi2, yvehi2, vehi_ids = get_vehicles(license_plate, vehicles_ids)
-
-                cv2.rectangle(frame, (int(x1), int(y1)), (int(x2), int(y2)), (0, 0, 255), 2)
-                cv2.rectangle(frame, (int(xvehi1), int(yvehi1)), (int(xvehi2), int(yvehi2)), (0, 0, 255), 2)
-
-                vehicle_crop = frame[int(yvehi1):int(yvehi2), int(xvehi1):int(xvehi2), :]
-
-                license_plate_crop = frame[int(y1):int(y2), int(x1):int(x2), :]
-                license_plate_gray = cv2.cvtColor(license_plate_crop, cv2.COLOR_BGR2GRAY)
-                kernel = np.array([[0, -1, 0], [-1, 5, -1], [0, -1, 0]])
-                license_plate_sharpen = cv2.filter2D(license_plate_gray, -1, kernel)
-
-                license_plate_text, license_plate_score = read_license_plate(license_plate_sharpen)
-
-                if x1 < mid_width:
-                    direction = "entrada"
-                else:
-                    direction = "salida"
-
-                if license_plate_text is not None and vehicle_crop.size > 0:
-                    if last_license_plate is not None and license_plate_text is not None:
-                        similarity = similarity_percentage(last_license_plate, license_plate_text)
-                        if license_plate_text == last_license_plate or similarity > 45:
-                            continue
-
-                    last_license_plate = license_plate_text
-
-                    print(f"Placa de licencia: {license_plate_text}")
-                    print(f"Confianza: {license_plate_score}")
-                    print(f"Vehículo: {direction}")
-
-                    vehicle_img_name = f"vehicle_{license_plate_text}_{current_time}.jpg"
-                    cv2.imwrite(f"photos/vehicles/{vehicle_img_name}", vehicle_crop)
-
-                    license_plate_img_name = f"license_plate_{license_plate_text}_{current_time}.jpg"
-                    cv2.imwrite(f"photos/license_plates/{license_plate_img_name}", license_plate_crop)
-
-        current_hour = datetime.now().hour
-        current_minute = datetime.now().minute
-        if current_hour == 12 and current_minute == 5 and current_hour != last_checked_hour:
-            delete_files_in_directory("photos/license_plates")
-            delete_files_in_directory("photos/vehicles")
-            last_checked_hour = current_hour
-
-        cv2.rectangle(frame, (0, 0), (mid_width, frame.shape[0]), (0, 0, 0), 2)
-        cv2.putText(frame, "Entrada", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-        cv2.rectangle(frame, (mid_width, 0), (width, frame.shape[0]), (0, 0, 0), 2)
-        cv2.putText(frame, "Salida", (mid_width + 10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-
-        frame = cv2.resize(frame, (0, 0), fx=0.7, fy=0.7)
-        cv2.imshow("frame", frame)
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
+    args = parse_args()
+    realtime = not args.fast
+
+    if args.replay:
+        source = ReplaySource(args.replay, start_frame=args.start_frame, realtime=realtime)
+    elif args.images:
+        source = ImageDirectorySource(args.images, fps=args.fps, realtime=realtime)
+    elif args.synthetic:
+        source = SyntheticSource(fps=args.fps, count=args.synthetic, realtime=realtime)
+    else:
+        source = VideoSource(args.video, realtime=realtime)
+
+    thread_budget = ThreadBudget.from_env()
+    thread_budget.apply()
+
+    recorded = args.replay and args.recorded_detections
+    scheduler = None
+    if recorded:
+        coco_model = RecordedModel(source, 'vehicles')
+        license_plate_model = RecordedModel(source, 'license_plates')
+        scheduler = RecordedScheduler(source)
+    else:
+        coco_model, license_plate_model = load_models(args.model)
+
+    # the detections are stamped with the current time, so they are kept out of the store of main.py
+    event_store = EventStore(args.events) if args.events else None
+
+    engine = DetectionEngine(coco_model, license_plate_model, event_store=event_store,
+                             thread_budget=thread_budget, post=False, deadline=0.3 if realtime else None,
+                             clock=source.clock, display=not args.no_display, window="frame",
+                             scheduler=scheduler, max_age=args.max_age, det_thresh=args.det_thresh)
+    if not recorded:
+        engine.warm_up()
+    engine.run(source)
+    engine.close()
+
+    engine.print_stats(source)
 
 
 if __name__ == '__main__':
@@ -1,12 +1,15 @@
 """
 Module containing utility functions.
 """
+import cv2
 import json
 import base64
 import string
+import time
 import shutil
 import easyocr
 import requests
+from collections import OrderedDict
 from sort.sort import *
 from dotenv import load_dotenv
 
@@ -204,6 +207,100 @@ def read_license_plate(license_plate_crop):
     return None, None
 
 
+def perceptual_hash(image):
+    """
+    Compute the difference hash of a grayscale image.
+
+    Args:
+        image (numpy.ndarray): Grayscale image.
+
+    Returns:
+        int: 64-bit hash, similar images give hashes with a small Hamming distance.
+    """
+    small = cv2.resize(image, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class LicensePlateCache(object):
+    """
+    Bounded cache of OCR results for near-identical license plate crops of the same vehicle.
+    """
+
+    def __init__(self, max_size=256, ttl=10.0, max_distance=6):
+        """
+        Args:
+            max_size (int): Maximum number of cached crops, the least recently used are evicted first.
+            ttl (float): Seconds a cached result stays valid.
+            max_distance (int): Maximum Hamming distance between hashes to consider two crops the same.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.ocr_time = 0.0
+
+    def _lookup(self, track_id, crop_hash, now):
+        for key in list(self.entries):
+            entry = self.entries[key]
+            if now - entry['time'] > self.ttl:
+                del self.entries[key]
+            elif key[0] == track_id and bin(key[1] ^ crop_hash).count('1') <= self.max_distance:
+                self.entries.move_to_end(key)
+                return entry
+        return None
+
+    def read(self, license_plate_crop, track_id):
+        """
+        Read the license plate text, reusing the result of a previous near-identical crop.
+
+        Args:
+            license_plate_crop (numpy.ndarray): Grayscale crop of the license plate.
+            track_id (int): ID of the tracked vehicle that owns the license plate.
+
+        Returns:
+            tuple: Tuple containing the formatted license plate text and its confidence score.
+        """
+        now = time.monotonic()
+        crop_hash = perceptual_hash(license_plate_crop)
+
+        entry = self._lookup(track_id, crop_hash, now)
+        if entry is not None:
+            self.hits += 1
+            return entry['text'], entry['score']
+
+        start = time.perf_counter()
+        text, score = read_license_plate(license_plate_crop)
+        self.ocr_time += time.perf_counter() - start
+        self.misses += 1
+
+        # failed reads are not cached, so the next frame of the vehicle is read again
+        if text is not None:
+            self.entries[(track_id, crop_hash)] = {'text': text, 'score': score, 'time': now}
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+        return text, score
+
+    def stats(self):
+        """
+        Get the cache statistics.
+
+        Returns:
+            dict: Hit rate and the estimated OCR time saved by the hits, in seconds.
+        """
+        total = self.hits + self.misses
+        mean_ocr_time = self.ocr_time / self.misses if self.misses else 0.0
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+            'ocr_time_saved': self.hits * mean_ocr_time
+        }
+
+
 def encode_image_to_base64(image_path):
     """
     Encode image to base64.